@@ -5,6 +5,7 @@ Rainey Aberle
 """
 
 import math
+from functools import lru_cache
 import pandas as pd
 import glob
 import geopandas as gpd
@@ -13,12 +14,24 @@ from tqdm.auto import tqdm
 import numpy as np
 import xarray as xr
 import rioxarray as rxr
-from sklearn.model_selection import KFold
+from rasterio.enums import Resampling
+from rasterio.features import rasterize
+from rasterio.transform import Affine
+from sklearn.model_selection import KFold, cross_validate
 from sklearn.inspection import permutation_importance
-from joblib import dump, load
+from sklearn.metrics import make_scorer, max_error
+from joblib import dump, load, Memory
 import matplotlib.pyplot as plt
 import sklearn
 
+# numba is optional: JIT-compile the per-pixel reductions when available,
+# otherwise fall back to vectorized NumPy
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 
 def convert_wgs_to_utm(lon: float, lat: float):
     """
@@ -46,36 +59,54 @@ def convert_wgs_to_utm(lon: float, lat: float):
     return epsg_code
 
 
-def determine_subregion_name_color(o1, o2):
-    if (o1 == 1.0) and (o2 == 1.0):
-        subregion_name, color = 'Brooks Range', 'c'
-    elif (o1 == 1.0) and (o2 == 2.0):
-        subregion_name, color = 'Alaska Range', '#1f78b4'
-    elif (o1 == 1.0) and (o2 == 3.0):
-        subregion_name, color = 'Aleutians', '#6d9c43'
-    elif (o1 == 1.0) and (o2 == 4.0):
-        subregion_name, color = 'W. Chugach Mtns.', '#264708'
-    elif (o1 == 1.0) and (o2 == 5.0):
-        subregion_name, color = 'St. Elias Mtns.', '#fb9a99'
-    elif (o1 == 1.0) and (o2 == 6.0):
-        subregion_name, color = 'N. Coast Ranges', '#e31a1c'
-    elif (o1 == 2.0) and (o2 == 1.0):
-        subregion_name, color = 'N. Rockies', '#cab2d6'
-    elif (o1 == 2.0) and (o2 == 2.0):
-        subregion_name, color = 'N. Cascades', '#fdbf6f'
-    elif (o1 == 2.0) and (o2 == 3.0):
-        subregion_name, color = 'C. Rockies', '#9657d9'
-    elif (o1 == 2.0) and (o2 == 4.0):
-        subregion_name, color = 'S. Cascades', '#ff7f00'
-    elif (o1 == 2.0) and (o2 == 5.0):
-        subregion_name, color = 'S. Rockies', '#6a3d9a'
-    else:
-        subregion_name = 'O1:' + o1 + ' O2:' + o2
-        color = 'k'
+# subregion names and plotting colors for each (O1Region, O2Region) pair
+_SUBREGION_TABLE = {(1, 1): ('Brooks Range', 'c'),
+                    (1, 2): ('Alaska Range', '#1f78b4'),
+                    (1, 3): ('Aleutians', '#6d9c43'),
+                    (1, 4): ('W. Chugach Mtns.', '#264708'),
+                    (1, 5): ('St. Elias Mtns.', '#fb9a99'),
+                    (1, 6): ('N. Coast Ranges', '#e31a1c'),
+                    (2, 1): ('N. Rockies', '#cab2d6'),
+                    (2, 2): ('N. Cascades', '#fdbf6f'),
+                    (2, 3): ('C. Rockies', '#9657d9'),
+                    (2, 4): ('S. Cascades', '#ff7f00'),
+                    (2, 5): ('S. Rockies', '#6a3d9a')}
 
+
+def determine_subregion_name_color(o1, o2):
+    subregion_name, color = _SUBREGION_TABLE.get((int(o1), int(o2)),
+                                                 ('O1:' + str(o1) + ' O2:' + str(o2), 'k'))
     return subregion_name, color
 
 
+def _percentile_sorted(sorted_arr, p):
+    """
+    Linear-interpolated percentile of an already-sorted array, where p is a fraction in [0, 1].
+    Equivalent to np.nanpercentile(arr, p * 100) after NaN removal.
+    """
+    k = p * (sorted_arr.size - 1)
+    lo = int(np.floor(k))
+    hi = min(lo + 1, sorted_arr.size - 1)
+    return sorted_arr[lo] + (k - lo) * (sorted_arr[hi] - sorted_arr[lo])
+
+
+if NUMBA_AVAILABLE:
+    @njit(fastmath=True, parallel=True, cache=True)
+    def _sla_counts(dem_flat, mask_flat, sla):
+        # count valid, snow-free-above-SLA, and snow-covered-below-SLA pixels in one pass
+        n_valid, n_above, n_below = 0, 0, 0
+        for i in prange(dem_flat.size):
+            v = dem_flat[i]
+            if not np.isnan(v):
+                n_valid += 1
+                m = mask_flat[i]
+                if (v > sla) and (m == 0):
+                    n_above += 1
+                elif (v < sla) and (m == 1):
+                    n_below += 1
+        return n_valid, n_above, n_below
+
+
 def calculate_sla_bounds(stats_df, dem, snow_cover_mask, dx, verbose=False):
     """
     Calculate uncertainty in snowline altitude derived from the transient AAR using the distribution of 
@@ -108,15 +139,25 @@ def calculate_sla_bounds(stats_df, dem, snow_cover_mask, dx, verbose=False):
     sla = stats_df['SLA_from_AAR_m']
     sla_percentile = 1 - aar
 
-    # Calculate glacier area
-    npx = len(np.argwhere(~np.isnan(dem.data.ravel())).ravel())
+    # Count valid and misclassified pixels
+    # cast elevations to float32 to halve memory traffic on these reductions
+    dem_arr = np.ascontiguousarray(dem.data, dtype=np.float32)
+    mask_arr = np.asarray(snow_cover_mask.data)
+    if NUMBA_AVAILABLE:
+        # single fused pass over the raster, parallelized across cores
+        dem_flat = dem_arr.ravel()
+        mask_flat = np.ascontiguousarray(mask_arr, dtype=np.float32).ravel()
+        npx, n_above, n_below = _sla_counts(dem_flat, mask_flat, float(sla))
+    else:
+        valid = ~np.isnan(dem_arr)
+        npx = np.count_nonzero(valid)
+        n_above = np.count_nonzero((dem_arr > sla) & (mask_arr == 0) & valid)
+        n_below = np.count_nonzero((dem_arr < sla) & (mask_arr == 1) & valid)
+
+    # Calculate glacier area and areas of misclassified pixels
     total_area = npx * dx**2
-        
-    # Calculate areas of misclassified pixels
-    snow_free_above_sla = xr.where((dem > sla) & (snow_cover_mask == 0), 1, 0)
-    snow_free_above_sla_area = len(np.argwhere(snow_free_above_sla.data.ravel()==1).ravel()) * dx**2
-    snow_covered_below_sla = xr.where((dem < sla) & (snow_cover_mask == 1), 1, 0)
-    snow_covered_below_sla_area = len(np.argwhere(snow_covered_below_sla.data.ravel()==1).ravel()) * dx**2
+    snow_free_above_sla_area = n_above * dx**2
+    snow_covered_below_sla_area = n_below * dx**2
 
     # Convert areas to percentiles
     delta_up = snow_free_above_sla_area / total_area
@@ -128,9 +169,13 @@ def calculate_sla_bounds(stats_df, dem, snow_cover_mask, dx, verbose=False):
     # Make sure percentiles are within [0,1]
     upper_sla_percentile, lower_sla_percentile = np.clip([upper_sla_percentile, lower_sla_percentile], 0, 1)
 
-    # Calculate SLA upper and lower bounds
-    sla_upper_bound = np.nanpercentile(dem.data.ravel(), upper_sla_percentile * 100)
-    sla_lower_bound = np.nanpercentile(dem.data.ravel(), lower_sla_percentile * 100)
+    # Calculate SLA upper and lower bounds: strip NaNs and sort the elevations once,
+    # then interpolate both percentile positions
+    dem_valid = dem_arr.ravel()
+    dem_valid = dem_valid[~np.isnan(dem_valid)]
+    dem_valid.sort()
+    sla_upper_bound = _percentile_sorted(dem_valid, upper_sla_percentile)
+    sla_lower_bound = _percentile_sorted(dem_valid, lower_sla_percentile)
 
     # Print results if requested
     if verbose:
@@ -171,6 +216,87 @@ def adjust_data_vars(dem_xr):
     return dem_xr
 
 
+def _prep_dem_for_aoi(dem, aoi):
+    """
+    Reproject and clip a DEM to an area of interest, returning the elevation data array.
+    Clips to the AOI bounding box before reprojecting so that only the pixels of interest are warped.
+
+    Parameters
+    ----------
+    dem: xarray.Dataset | xarray.DataArray
+        digital elevation model
+    aoi: geopandas.geodataframe.GeoDataFrame
+        area of interest
+
+    Returns
+    ----------
+    elev_data: numpy.ndarray
+        elevation data clipped to the AOI, in the AOI CRS
+    """
+    # clip DEM to the AOI bounding box to shrink the raster before warping
+    dem = dem.rio.clip_box(*aoi.total_bounds, crs=aoi.crs)
+    # reproject DEM to AOI CRS, unless it already matches
+    dst_epsg = aoi.crs.to_epsg()
+    src_epsg = dem.rio.crs.to_epsg() if dem.rio.crs else None
+    if src_epsg != dst_epsg:
+        dem = dem.rio.reproject('EPSG:' + str(dst_epsg), resampling=Resampling.nearest)
+    # convert to dataset if needed
+    if isinstance(dem, xr.DataArray):
+        dem = dem.to_dataset(name='elevation')
+    # adjust DEM data variables
+    dem = adjust_data_vars(dem)
+    # rasterize the AOI onto the DEM grid and mask out pixels outside the geometry,
+    # skipping the polygon clip machinery
+    x, y = dem.x.data, dem.y.data
+    res_x, res_y = x[1] - x[0], y[1] - y[0]
+    transform = (Affine.translation(x[0] - res_x / 2, y[0] - res_y / 2)
+                 * Affine.scale(res_x, res_y))
+    aoi_mask = rasterize([(geom, 1) for geom in aoi.geometry],
+                         out_shape=dem.elevation.data.shape,
+                         transform=transform, fill=0, dtype='uint8')
+    # cast elevations to float32 to halve memory traffic in the downstream reductions
+    elev_data = np.asarray(dem.elevation.data, dtype=np.float32)
+    elev_data[aoi_mask == 0] = np.nan
+    return elev_data
+
+
+# Hypsometric Index category bins and labels from Jiskoot et al. (2009)
+_HI_BINS = np.array([-1.5, -1.2, 1.2, 1.5])
+_HI_LABELS = ['Very top heavy', 'Top heavy', 'Equidimensional', 'Bottom heavy', 'Very bottom heavy']
+
+
+def _hi_stats(elev_data):
+    """
+    Calculate the minimum, median, and maximum elevation in a single pass over the DEM.
+
+    Parameters
+    ----------
+    elev_data: numpy.ndarray
+        elevation data, may contain NaN and no data values
+
+    Returns
+    ----------
+    h_min, h_med, h_max: float
+        elevation statistics, or None if no valid elevations remain
+    """
+    # flatten and remove NaN and no data values, accumulating the mask in place
+    flat = np.ascontiguousarray(elev_data).ravel()
+    good = np.isfinite(flat)
+    good &= flat > -9999
+    good &= flat < 1e38
+    flat = flat[good]
+    if flat.size == 0:
+        return None
+    # partition around the min, median, and max ranks in O(n), no full sort
+    n = flat.size
+    mid_lo, mid_hi = (n - 1) // 2, n // 2
+    flat.partition([0, mid_lo, mid_hi, n - 1])
+    h_min = flat[0]
+    h_med = (flat[mid_lo] + flat[mid_hi]) / 2
+    h_max = flat[n - 1]
+    return h_min, h_med, h_max
+
+
 def calculate_hypsometric_index(dem_fn, aoi):
     """
     Calculate Hypsometric Index using an input DEM file name and area of interest shapefile. 
@@ -191,46 +317,60 @@ def calculate_hypsometric_index(dem_fn, aoi):
     
     # load DEM as DataArray
     dem = rxr.open_rasterio(dem_fn)
-    # reproject DEM to AOI CRS
-    dem = dem.rio.reproject('EPSG:'+str(aoi.crs.to_epsg()))
-    # clip DEM to AOI
+    # reproject and clip DEM to AOI
     try:
-        dem_aoi = dem.rio.clip(aoi.geometry, aoi.crs)
+        elev_data = _prep_dem_for_aoi(dem, aoi)
     except:
         return 'N/A', 'N/A'
-    # convert to dataset
-    dem_aoi_ds = dem_aoi.to_dataset(name='elevation')
-    # adjust DEM data variables
-    dem_aoi_ds = adjust_data_vars(dem_aoi_ds)
-    # set no data values to NaN
-    dem_aoi_ds = xr.where((dem_aoi_ds > 1e38) | (dem_aoi_ds <= -9999), np.nan, dem_aoi_ds)
+    # calculate elevation statistics, filtering out NaN and no data values
+    stats = _hi_stats(elev_data)
     # check that there is data after removing no data values
-    if np.isnan(dem_aoi_ds.elevation.data).all():
+    if stats is None:
         return 'N/A', 'N/A'
-    # calculate elevation statistics
-    h_max = np.nanmax(np.ravel(dem_aoi_ds.elevation.data))
-    h_min = np.nanmin(np.ravel(dem_aoi_ds.elevation.data))
-    h_med = np.nanmedian(np.ravel(dem_aoi_ds.elevation.data))
+    h_min, h_med, h_max = stats
     # calculate HI, where HI = (H_max - H_med) / (H_med - H_min). If 0 < HI < 1, HI = -1/HI.
     hi = (h_max - h_med) / (h_med - h_min)
     if (0 < hi) and (hi < 1):
         hi = -1 / hi
     # determine HI category
-    if hi <= -1.5:
-        hi_category = 'Very top heavy'
-    elif (hi > -1.5) and (hi <= -1.2):
-        hi_category = 'Top heavy'
-    elif (hi > -1.2) and (hi <= 1.2):
-        hi_category = 'Equidimensional'
-    elif (hi > 1.2) and (hi <= 1.5):
-        hi_category = 'Bottom heavy'
-    elif hi > 1.5:
-        hi_category = 'Very bottom heavy'
+    hi_category = _HI_LABELS[int(np.searchsorted(_HI_BINS, hi, side='left'))]
 
     return hi, hi_category
 
 
-def construct_site_training_data(study_sites_path, site_name, dem):
+# persistent disk cache for site training data, keyed on the input files' modification times
+_memory = Memory(location=os.path.join('.cache', 'site_training'), verbose=0)
+
+
+@lru_cache(maxsize=64)
+def _read_snowlines(snowline_fn, mtime):
+    """
+    Read a snowlines CSV, caching the parsed result in memory. The mtime argument keys the
+    cache so edited files are re-read. Callers must copy before mutating.
+    """
+    return pd.read_csv(snowline_fn,
+                       usecols=['site_name', 'datetime', 'dataset', 'AAR', 'ELA_from_AAR_m'],
+                       parse_dates=['datetime'],
+                       dtype={'AAR': 'float32', 'ELA_from_AAR_m': 'float32'})
+
+
+@lru_cache(maxsize=64)
+def _read_era(era_fn, mtime):
+    """
+    Read an ERA CSV, caching the parsed result in memory. The mtime argument keys the
+    cache so edited files are re-read. Callers must copy before mutating.
+    """
+    return pd.read_csv(era_fn,
+                       usecols=['Date', 'Temperature_Celsius_Adjusted', 'Precipitation_Meters',
+                                'Cumulative_Positive_Degree_Days', 'Cumulative_Snowfall_mwe'],
+                       parse_dates=['Date'],
+                       dtype={'Temperature_Celsius_Adjusted': 'float32',
+                              'Precipitation_Meters': 'float32',
+                              'Cumulative_Positive_Degree_Days': 'float32',
+                              'Cumulative_Snowfall_mwe': 'float32'})
+
+
+def construct_site_training_data(study_sites_path, site_name, dem, dem_fn=None):
     """
 
     Parameters
@@ -241,6 +381,9 @@ def construct_site_training_data(study_sites_path, site_name, dem):
         name of site folder
     dem: xarray.Dataset
         digital elevation model over site
+    dem_fn: str (=None)
+        DEM file name, used to fingerprint the DEM in the cache key. If None, the disk cache
+        is bypassed, since the cached output depends on the DEM.
 
     Returns
     -------
@@ -248,55 +391,80 @@ def construct_site_training_data(study_sites_path, site_name, dem):
         table containing training data for site
     """
 
-    # Load snowlines
-    snowlines_df = pd.DataFrame()
+    # Resolve input file names
     snowlines_path = os.path.join(study_sites_path, site_name)
     snowline_fns = glob.glob(os.path.join(snowlines_path, '*snowlines*.csv'))
     if len(snowline_fns) == 0:
         print('No snowlines found, continuing...')
         return None
-    snowlines_df = pd.read_csv(snowline_fns[0])
-    snowlines_df['datetime'] = pd.to_datetime(snowlines_df['datetime'])
+    snowline_fn = snowline_fns[0]
+    era_fns = glob.glob(os.path.join(study_sites_path, site_name, 'ERA', '*.csv'))
+    era_fn = max(era_fns, key=os.path.getctime)
+    aoi_fn = glob.glob(os.path.join(study_sites_path, site_name, 'AOIs', '*RGI*shp'))[0]
+
+    # Construct cache key from input file modification times so edited inputs invalidate stale results
+    snowline_mtime = os.path.getmtime(snowline_fn)
+    era_mtime = os.path.getmtime(era_fn)
+    aoi_mtime = os.path.getmtime(aoi_fn)
+
+    # without a DEM file name the cache key cannot cover the DEM (the DEM object itself is
+    # excluded from hashing), so only use the disk cache when a fingerprint is available
+    if dem_fn is None:
+        worker = _construct_site_training_data
+        dem_fingerprint = None
+    else:
+        worker = _construct_site_training_data_cached
+        dem_fingerprint = (dem_fn, os.path.getmtime(dem_fn))
+
+    return worker(site_name, snowline_fn, snowline_mtime, era_fn, era_mtime,
+                  aoi_fn, aoi_mtime, dem_fingerprint, dem)
+
+
+def _construct_site_training_data(site_name, snowline_fn, snowline_mtime, era_fn, era_mtime,
+                                  aoi_fn, aoi_mtime, dem_fingerprint, dem):
+    """
+    Worker for construct_site_training_data. The mtime and fingerprint arguments only serve as
+    cache keys for the cached variant below; the DEM itself is excluded from hashing.
+    """
+
+    # Load snowlines (cached in memory across calls, so copy before mutating)
+    snowlines_df = _read_snowlines(snowline_fn, snowline_mtime).copy()
     snowlines_df['Date'] = snowlines_df['datetime'].values.astype('datetime64[D]')
     # don't include observations from PlanetScope
     snowlines_df = snowlines_df.loc[snowlines_df['dataset'] != 'PlanetScope']
 
-    # Load ERA data
-    era_fns = glob.glob(os.path.join(study_sites_path, site_name, 'ERA', '*.csv'))
-    era_fn = max(era_fns, key=os.path.getctime)
-    era = pd.read_csv(era_fn)
-    era.reset_index(drop=True, inplace=True)
-    era['Date'] = pd.to_datetime(era['Date'])
+    # Load ERA data (cached in memory across calls, so copy before mutating)
+    era = _read_era(era_fn, era_mtime).copy()
     era['Date'] = era['Date'].values.astype('datetime64[D]')
+    # compute calendar year and water year once
+    year = era['Date'].dt.year.values
+    month = era['Date'].dt.month.values
+    era['Water_Year'] = np.where(month >= 10, year, year - 1)  # add a water year column
     # Calculate mean annual temperature range and max. precipitation
-    annual_min_air_temp_mean = np.nanmean(
-        era.groupby(era['Date'].dt.year)['Temperature_Celsius_Adjusted'].min().values)
-    annual_max_air_temp_mean = np.nanmean(
-        era.groupby(era['Date'].dt.year)['Temperature_Celsius_Adjusted'].max().values)
-    era['Water_Year'] = era['Date'].apply(
-        lambda x: x.year if x.month >= 10 else x.year - 1)  # add a water year column
-    era['Cumulative_Precipitation_Meters'] = era.groupby(era['Water_Year'])[
+    annual_air_temps = era.groupby(year)['Temperature_Celsius_Adjusted'].agg(['min', 'max'])
+    annual_min_air_temp_mean = np.nanmean(annual_air_temps['min'].values)
+    annual_max_air_temp_mean = np.nanmean(annual_air_temps['max'].values)
+    era['Cumulative_Precipitation_Meters'] = era.groupby('Water_Year')[
         'Precipitation_Meters'].cumsum()
     annual_max_precip_mean = np.nanmean(
-        era.groupby(era['Date'].dt.year)['Cumulative_Precipitation_Meters'].max().values)
+        era.groupby(year)['Cumulative_Precipitation_Meters'].max().values)
 
-    # Merge the snowlines and climate DataFrames
-    training_df = pd.merge(snowlines_df, era, on='Date', how='outer')
+    # Merge the snowlines and climate DataFrames, keeping only dates present in both
+    training_df = pd.merge(snowlines_df, era, on='Date', how='inner')
     training_df['Mean_Annual_Air_Temp_Range'] = annual_max_air_temp_mean - annual_min_air_temp_mean
     training_df['Mean_Annual_Precipitation_Max'] = annual_max_precip_mean
 
     # Adjust dataframe
     training_df.sort_values(by='Date', inplace=True)
-    training_df.dropna(inplace=True)
-    training_df.reset_index(drop=True, inplace=True)
-    # select columns
+    # select columns, dropping rows with missing values
     cols = ['site_name', 'Date', 'AAR', 'ELA_from_AAR_m',
             'Cumulative_Positive_Degree_Days', 'Cumulative_Snowfall_mwe',
             'Mean_Annual_Air_Temp_Range', 'Mean_Annual_Precipitation_Max']
+    training_df = training_df.dropna(subset=cols)
+    training_df.reset_index(drop=True, inplace=True)
     training_df = training_df[cols]
 
     # Load RGI outline
-    aoi_fn = glob.glob(os.path.join(study_sites_path, site_name, 'AOIs', '*RGI*shp'))[0]
     aoi = gpd.read_file(aoi_fn)
     # reproject to optimal utm zone
     aoi_centroid = [aoi.geometry[0].centroid.xy[0][0],
@@ -311,49 +479,26 @@ def construct_site_training_data(study_sites_path, site_name, dem):
     for column in aoi_columns:
         training_df[column] = aoi[column].values[0]
 
-    def adjust_data_vars(im_xr):
-        if 'band_data' in im_xr.data_vars:
-            im_xr = im_xr.rename({'band_data': 'elevation'})
-        if 'band' in im_xr.dims:
-            elev_data = im_xr.elevation.data[0]
-            im_xr = im_xr.drop_dims('band')
-            im_xr['elevation'] = (('y', 'x'), elev_data)
-        return im_xr
-
     # Calculate Hypsometric Index (HI)
     # Jiskoot et al. (2009): https://doi.org/10.3189/172756410790595796
-    # clip DEM to AOI
-    dem_utm = dem.rio.reproject('EPSG:'+str(aoi.crs.to_epsg()))
-    dem_utm_aoi = dem_utm.rio.clip(aoi.geometry, aoi.crs)
-    # adjust DEM data variables
-    dem_utm_aoi = adjust_data_vars(dem_utm_aoi)
-    # set no data values to NaN
-    dem_utm_aoi = xr.where((dem_utm_aoi > 1e38) | (dem_utm_aoi <= -9999), np.nan, dem_utm_aoi)
-    # calculate elevation statistics
-    h_max = np.nanmax(np.ravel(dem_utm_aoi.elevation.data))
-    h_min = np.nanmin(np.ravel(dem_utm_aoi.elevation.data))
-    h_med = np.nanmedian(np.ravel(dem_utm_aoi.elevation.data))
+    # reproject and clip DEM to AOI, then calculate elevation statistics
+    h_min, h_med, h_max = _hi_stats(_prep_dem_for_aoi(dem, aoi))
     # calculate HI, where HI = (H_max - H_med) / (H_med - H_min). If 0 < HI < 1, HI = -1/HI.
     hi = (h_max - h_med) / (h_med - h_min)
     if (0 < hi) and (hi < 1):
         hi = -1 / hi
     # determine HI category
-    if hi <= -1.5:
-        hi_category = 'Very top heavy'
-    elif (hi > -1.5) and (hi <= -1.2):
-        hi_category = 'Top heavy'
-    elif (hi > -1.2) and (hi <= 1.2):
-        hi_category = 'Equidimensional'
-    elif (hi > 1.2) and (hi <= 1.5):
-        hi_category = 'Bottom heavy'
-    elif hi > 1.5:
-        hi_category = 'Very bottom heavy'
+    hi_category = _HI_LABELS[int(np.searchsorted(_HI_BINS, hi, side='left'))]
     training_df['Hypsometric_Index'] = hi
     training_df['Hypsometric_Index_Category'] = hi_category
 
     return training_df
 
 
+# disk-cached variant of the worker, used when the caller provides a DEM fingerprint
+_construct_site_training_data_cached = _memory.cache(_construct_site_training_data, ignore=['dem'])
+
+
 def determine_best_model(data, models, model_names, feature_columns, labels, out_path,
                          best_model_fn='best_model.joblib', save_performances=False,
                          performances_fn='model_performances.csv', num_folds=10):
@@ -410,42 +555,23 @@ def determine_best_model(data, models, model_names, feature_columns, labels, out
 
         print(name)
 
-        # Conduct K-Fold cross-validation
+        # Conduct K-Fold cross-validation, fitting folds in parallel
+        # NOTE: the 'max_error' scorer string was renamed 'neg_max_error' in scikit-learn 1.6,
+        # so build that scorer from the metric directly to work on any version
         kfold = KFold(n_splits=num_folds, shuffle=True, random_state=1)
-        mean_abs_err_folds = np.zeros(num_folds)
-        mean_sq_err_folds = np.zeros(num_folds)
-        mean_abs_percentage_err_folds = np.zeros(num_folds)
-        max_err_folds = np.zeros(num_folds)
-        rsq_folds = np.zeros(num_folds)
-
-        # loop through fold indices
-        j = 0  # fold counter
-        for train_ix, test_ix in kfold.split(X):
-            # split data into training and testing using kfold indices
-            X_train, X_test = X.iloc[train_ix], X.iloc[test_ix]
-            y_train, y_test = np.ravel(y.iloc[train_ix].values), np.ravel(y.iloc[test_ix].values)
-
-            # fit model to X_train and y_train
-            model.fit(X_train, y_train)
-
-            # predict outputs for X_test values
-            y_pred = model.predict(X_test)
-
-            # calculate evaluation metrics
-            mean_abs_err_folds[j] = sklearn.metrics.mean_absolute_error(y_test, y_pred)
-            mean_sq_err_folds[j] = sklearn.metrics.mean_squared_error(y_test, y_pred)
-            mean_abs_percentage_err_folds[j] = sklearn.metrics.mean_absolute_percentage_error(y_test, y_pred)
-            max_err_folds[j] = sklearn.metrics.max_error(y_test, y_pred)
-            rsq_folds = sklearn.metrics.r2_score(y_test, y_pred)
-
-            j += 1
+        scoring = {'neg_mean_absolute_error': 'neg_mean_absolute_error',
+                   'neg_mean_squared_error': 'neg_mean_squared_error',
+                   'neg_mean_absolute_percentage_error': 'neg_mean_absolute_percentage_error',
+                   'max_error': make_scorer(max_error, greater_is_better=False),
+                   'r2': 'r2'}
+        cv_out = cross_validate(model, X, np.ravel(y.values), cv=kfold, scoring=scoring, n_jobs=-1)
 
         # take mean of evaluation metrics for all folds
-        mean_abs_err[i] = np.nanmean(mean_abs_err_folds)
-        mean_sq_err[i] = np.nanmean(mean_sq_err_folds)
-        mean_abs_percentage_err[i] = np.nanmean(rsq_folds)
-        max_err[i] = np.nanmean(max_err_folds)
-        rsq[i] = np.nanmean(rsq_folds)
+        mean_abs_err[i] = np.nanmean(-cv_out['test_neg_mean_absolute_error'])
+        mean_sq_err[i] = np.nanmean(-cv_out['test_neg_mean_squared_error'])
+        mean_abs_percentage_err[i] = np.nanmean(-cv_out['test_neg_mean_absolute_percentage_error'])
+        max_err[i] = np.nanmean(-cv_out['test_max_error'])
+        rsq[i] = np.nanmean(cv_out['test_r2'])
 
         # display performance results
         print('    Mean absolute error = ' + str(mean_abs_err[i]))
@@ -462,7 +588,7 @@ def determine_best_model(data, models, model_names, feature_columns, labels, out
         print('Evaluation metrics for all models saved to file:', os.path.join(out_path, performances_fn))
 
     # -----Determine best model
-    ibest = np.argwhere(mean_abs_err == np.min(mean_abs_err))[0][0]
+    ibest = int(np.argmin(mean_abs_err))
     best_model = models[ibest]
     best_model_name = model_names[ibest]
     print('Most accurate classifier: ' + best_model_name)
@@ -517,11 +643,11 @@ def assess_model_feature_importances(model, X, y, feature_columns, feature_colum
         feature_columns_display = feature_columns
 
     # Calculate feature importances using permutatiion
-    feature_importances = permutation_importance(model, X, y, n_repeats=n_repeats, random_state=random_state, n_jobs=2)
+    feature_importances = permutation_importance(model, X, y, n_repeats=n_repeats, random_state=random_state,
+                                                 n_jobs=-1)
     # convert to pandas.DataFrame
-    feature_importances_df = pd.DataFrame()
-    for i, column in enumerate(feature_columns):
-        feature_importances_df[column] = feature_importances['importances'][i]
+    importances = np.asarray(feature_importances['importances'])
+    feature_importances_df = pd.DataFrame(importances.T, columns=list(feature_columns))
 
     # plot
     plt.rcParams.update({'font.size': 12, 'font.sans-serif': 'Arial'})
@@ -536,7 +662,7 @@ def assess_model_feature_importances(model, X, y, feature_columns, feature_colum
                                 capprops=dict(linestyle='-', linewidth=1.5),
                                 showfliers=True)
     ax.set_xticklabels(feature_columns_display, rotation=90)
-    ax.set_ylim(0, np.nanmax(np.ravel(feature_importances['importances'])) * 1.1)
+    ax.set_ylim(0, np.nanmax(importances) * 1.1)
     ax.set_ylabel('Importance')
     ax.grid()
     plt.show()
@@ -577,35 +703,15 @@ def reduce_memory_usage(df, verbose=True):
     df: pandas.DataFrame
         output dataframe with reduced memory usage
     """
-    numerics = ["int8", "int16", "int32", "int64", "float16", "float32", "float64"]
     start_mem = df.memory_usage().sum() / 1024 ** 2
-    for col in df.columns:
-        col_type = df[col].dtypes
-        if col_type in numerics:
-            c_min = df[col].min()
-            c_max = df[col].max()
-            if str(col_type)[:3] == "int":
-                if c_min > np.iinfo(np.int8).min and c_max < np.iinfo(np.int8).max:
-                    df[col] = df[col].astype(np.int8)
-                elif c_min > np.iinfo(np.int16).min and c_max < np.iinfo(np.int16).max:
-                    df[col] = df[col].astype(np.int16)
-                elif c_min > np.iinfo(np.int32).min and c_max < np.iinfo(np.int32).max:
-                    df[col] = df[col].astype(np.int32)
-                elif c_min > np.iinfo(np.int64).min and c_max < np.iinfo(np.int64).max:
-                    df[col] = df[col].astype(np.int64)
-            else:
-                #                if (
-                #                    c_min > np.finfo(np.float16).min
-                #                    and c_max < np.finfo(np.float16).max
-                #                ):
-                #                    df[col] = df[col].astype(np.float16) # float16 not compatible with linalg
-                if (  # elif (
-                        c_min > np.finfo(np.float32).min
-                        and c_max < np.finfo(np.float32).max
-                ):
-                    df[col] = df[col].astype(np.float32)
-                else:
-                    df[col] = df[col].astype(np.float64)
+    # let pandas determine the smallest safe dtype in a single pass per column
+    # NOTE: float16 not compatible with linalg, so floats only downcast to float32
+    num_cols = df.select_dtypes(include=['int', 'float']).columns
+    for col in num_cols:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        else:
+            df[col] = pd.to_numeric(df[col], downcast='float')
     end_mem = df.memory_usage().sum() / 1024 ** 2
     if verbose:
         print(